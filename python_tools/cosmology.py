@@ -1,5 +1,5 @@
 import numpy as np
-from scipy.integrate import quad
+from scipy.integrate import cumulative_trapezoid
 
 
 class Cosmology:
@@ -8,10 +8,13 @@ class Cosmology:
         # print('Initializing cosmology with omega_m = %.3f' % omega_m)
         c = 299792.458
         omega_l = 1.-omega_m
+        # tabulate the comoving distance with a single cumulative integration
+        # over a fine redshift grid, rather than one quadrature per node
         ztab = np.linspace(0, 4, 1000)
-        rtab = np.zeros_like(ztab)
-        for i in range(len(ztab)):
-            rtab[i] = quad(lambda x: 0.01 * c / np.sqrt(omega_m * (1 + x) ** 3 + omega_l), 0, ztab[i])[0]
+        zfine = np.linspace(0, 4, 10000)
+        integrand = 0.01 * c / np.sqrt(omega_m * (1 + zfine) ** 3 + omega_l)
+        rfine = cumulative_trapezoid(integrand, zfine, initial=0)
+        rtab = np.interp(ztab, zfine, rfine)
 
         self.h = h
         self.c = c
@@ -3,17 +3,31 @@ import sys
 import os
 import numpy as np
 import healpy as hp
-import random
 import subprocess
+import shutil
 import glob
 from scipy.spatial import cKDTree
-from scipy.integrate import quad
 from python_tools.cosmology import Cosmology
 from python_tools.galaxycat import GalaxyCatalogue
 from scipy.signal import savgol_filter
 from scipy.interpolate import InterpolatedUnivariateSpline
 
 
+def sorted_intersect1d(arr1, arr2):
+    """Intersection of two sorted arrays of unique values.
+
+    Equivalent to np.intersect1d(arr1, arr2, assume_unique=True), but exploits the sorted
+    input to use binary search instead of the concatenate-and-sort that intersect1d performs.
+    """
+
+    if len(arr1) == 0 or len(arr2) == 0:
+        return arr1[:0]
+    pos = np.searchsorted(arr2, arr1)
+    pos[pos == len(arr2)] = 0  # out-of-range entries cannot match anyway, see below
+    # arr1 values beyond arr2's range compare unequal to arr2[0], so are correctly dropped
+    return arr1[arr2[pos] == arr1]
+
+
 class ZobovVoids:
 
     def __init__(self, parms):
@@ -34,6 +48,10 @@ class ZobovVoids:
         # file path for ZOBOV-formatted tracer data
         self.posn_file = self.output_folder + parms.handle + "_pos.dat"
 
+        # cache of parsed ZOBOV output files, keyed by filename; the same zone and
+        # volume files are read by several of the post-processing steps
+        self.file_cache = {}
+
         # load up the tracer catalogue information
         cat = GalaxyCatalogue(parms, randoms=False)
 
@@ -59,12 +77,7 @@ class ZobovVoids:
             tracers[:, 1] = cat.y
             tracers[:, 2] = cat.z
             # check that tracer positions lie within the box, wrap using PBC if not
-            tracers[tracers[:, 0] > self.box_length, 0] -= self.box_length
-            tracers[tracers[:, 1] > self.box_length, 1] -= self.box_length
-            tracers[tracers[:, 2] > self.box_length, 2] -= self.box_length
-            tracers[tracers[:, 0] < 0, 0] += self.box_length
-            tracers[tracers[:, 1] < 0, 1] += self.box_length
-            tracers[tracers[:, 2] < 0, 2] += self.box_length
+            np.mod(tracers, self.box_length, out=tracers)
 
             # determine mean tracer number density
             self.tracer_dens = 1.0 * self.num_tracers / (self.box_length ** 3.)
@@ -106,26 +119,28 @@ class ZobovVoids:
             else:
                 mask = hp.read_map(parms.mask_file, verbose=False)
                 self.mask_file = parms.mask_file
+                self.mask = mask  # keep in memory, several later steps need it
                 # check whether the mask is correct
-                ra = self.tracers[:, 3]
-                dec = self.tracers[:, 4]
                 nside = hp.get_nside(mask)
-                pixels = hp.ang2pix(nside, np.deg2rad(90 - dec), np.deg2rad(ra))
+                # colatitude computed in place to avoid intermediate arrays
+                theta = self.tracers[:, 4] * (-np.pi / 180.)
+                theta += np.pi / 2.
+                pixels = hp.ang2pix(nside, theta, np.deg2rad(self.tracers[:, 3]))
                 if np.any(mask[pixels] == 0):
                     print('Galaxies exist where mask=0. Maybe check the input?')
                     sys.stdout.flush()
-                    # all_indices = np.arange(len(self.tracers))
-                    # bad_inds = np.where(mask[pixels] == 0)[0]
-                    # good_inds = all_indices[np.logical_not(np.in1d(all_indices, bad_inds))]
-                    # self.tracers = self.tracers[good_inds, :]
+                    # self.tracers = self.tracers[mask[pixels] > 0, :]
 
                 # effective sky fraction
                 self.f_sky = 1.0 * np.sum(mask) / len(mask)
 
             # finally, remove any instances of two galaxies at the same location, otherwise tessellation will fail
             # (this is a problem with DR12 Patchy mocks, I've not seen any such instances in real survey data ...)
-            # NOTE: the following line will not work with older versions of numpy!!
-            unique_tracers = np.unique(self.tracers, axis=0)
+            order = np.lexsort(self.tracers.T)
+            sorted_tracers = self.tracers[order]
+            keep = np.ones(self.tracers.shape[0], dtype=bool)
+            keep[1:] = np.any(sorted_tracers[1:] != sorted_tracers[:-1], axis=1)
+            unique_tracers = sorted_tracers[keep]
             if unique_tracers.shape[0] < self.tracers.shape[0]:
                 print('Removing %d galaxies with duplicate positions' %
                       (self.tracers.shape[0] - unique_tracers.shape[0]))
@@ -214,13 +229,16 @@ class ZobovVoids:
         rdist = self.cosmo.get_comoving_distance(redshift)
 
         # convert RA, Dec angles in degrees to theta, phi in radians
-        phi = ra * np.pi / 180.
-        theta = np.pi / 2. - dec * np.pi / 180.
+        phi = ra * (np.pi / 180.)
+        theta = dec * (-np.pi / 180.)
+        theta += np.pi / 2.
 
         # obtain Cartesian coordinates
+        # (compute each trig term only once, the products are then cheap)
+        rst = rdist * np.sin(theta)
         galaxies = np.zeros((self.num_tracers, 8))
-        galaxies[:, 0] = rdist * np.sin(theta) * np.cos(phi)  # r*cos(ra)*cos(dec)
-        galaxies[:, 1] = rdist * np.sin(theta) * np.sin(phi)  # r*sin(ra)*cos(dec)
+        galaxies[:, 0] = rst * np.cos(phi)  # r*cos(ra)*cos(dec)
+        galaxies[:, 1] = rst * np.sin(phi)  # r*sin(ra)*cos(dec)
         galaxies[:, 2] = rdist * np.cos(theta)  # r*sin(dec)
         # standard format includes RA, Dec, redshift info
         galaxies[:, 3] = ra
@@ -290,19 +308,21 @@ class ZobovVoids:
         npix = hp.nside2npix(nside)
 
         # use tracer RA,Dec info to see which sky pixels are occupied
-        phi = self.tracers[:, 3] * np.pi / 180.
-        theta = np.pi / 2. - self.tracers[:, 4] * np.pi / 180.
+        phi = self.tracers[:, 3] * (np.pi / 180.)
+        theta = self.tracers[:, 4] * (-np.pi / 180.)
+        theta += np.pi / 2.
         pixels = hp.ang2pix(nside, theta, phi)
 
         # crude binary mask
         mask = np.zeros(npix)
         mask[pixels] = 1.
 
-        # write this mask to file
+        # write this mask to file, keeping a copy in memory for later use
         hp.write_map(self.mask_file, mask)
+        self.mask = mask
 
         # return sky fraction
-        f_sky = 1.0 * sum(mask) / len(mask)
+        f_sky = 1.0 * mask.sum() / len(mask)
         return f_sky
 
     def find_mask_boundary(self):
@@ -312,7 +332,7 @@ class ZobovVoids:
         :return: a healpy map instance with pixels set =1 if they are on the survey boundary, =0 if not
         """
 
-        mask = hp.read_map(self.mask_file, verbose=False)
+        mask = self.mask
         nside = 512
         mask = hp.ud_grade(mask, nside)
         npix = hp.nside2npix(nside)
@@ -320,37 +340,84 @@ class ZobovVoids:
 
         # find pixels outside the mask that neighbour pixels within it
         # do this step in a loop, to get a thicker boundary layer
-        for j in range(int(3 + nside / 64)):
+        num_layers = 3 + nside // 64
+        for j in range(num_layers):
             if j == 0:
                 filled_inds = np.nonzero(mask)[0]
             else:
                 filled_inds = np.nonzero(boundary)[0]
-            theta, phi = hp.pix2ang(nside, filled_inds)
-            neigh_pix = hp.get_all_neighbours(nside, theta, phi)
-            for i in range(neigh_pix.shape[1]):
-                outsiders = neigh_pix[(mask[neigh_pix[:, i]] == 0) & (neigh_pix[:, i] > -1)
-                                      & (boundary[neigh_pix[:, i]] == 0), i]
-                # >-1 condition takes care of special case where neighbour wasn't found
-                if j == 0:
-                    boundary[outsiders] = 2
-                else:
-                    boundary[outsiders] = 1
+            # get_all_neighbours accepts pixel indices directly, no need to go via angles
+            neigh_pix = hp.get_all_neighbours(nside, filled_inds)
+            # >-1 condition takes care of special case where neighbour wasn't found
+            candidates = neigh_pix[neigh_pix > -1]
+            outsiders = candidates[(mask[candidates] == 0) & (boundary[candidates] == 0)]
+            if j == 0:
+                boundary[outsiders] = 2
+            else:
+                boundary[outsiders] = 1
         boundary[boundary == 2] = 0  # this sets a 1-pixel gap between boundary and survey so buffers are not too close
 
         return boundary
 
+    def generate_shell_mocks(self, r_low, r_high, mask, f_sky):
+        """Generates buffer mock particles with uniform density in a radial shell within a sky mask
+
+        :param r_low: inner radius of the shell
+        :param r_high: outer radius of the shell
+        :param mask: healpy map instance of the sky region in which to place the mocks
+        :param f_sky: sky fraction covered by the mask
+
+        :returns:
+        ----
+        mocks: array of mock particle information in standard format
+        rdist: radial distances assigned to the mock particles
+        mask: the input mask, upgraded in resolution if that was necessary
+        """
+
+        buffer_dens = self.mock_dens_ratio * self.tracer_dens
+        nside = hp.get_nside(mask)
+        shell_pix = np.nonzero(mask)[0]
+        numpix = len(shell_pix)
+
+        # how many buffer particles fit in this shell
+        shell_volume = f_sky * 4. * np.pi * (r_high ** 3. - r_low ** 3.) / 3.
+        num_mocks = int(np.ceil(buffer_dens * shell_volume))
+        mocks = np.zeros((num_mocks, 8))
+
+        # generate random radial positions within the shell
+        rdist = (r_low ** 3. + (r_high ** 3. - r_low ** 3.) * np.random.rand(num_mocks)) ** (1. / 3)
+
+        # generate mock angular positions within the mask
+        # NOTE: these are not random positions, since they are all centred in a Healpix pixel
+        # but for buffer particles this is not important (and is generally faster)
+        while num_mocks > numpix:
+            # more mock posns required than mask pixels, so upgrade mask to get more pixels
+            nside *= 2
+            mask = hp.ud_grade(mask, nside)
+            shell_pix = np.nonzero(mask)[0]
+            numpix = len(shell_pix)
+        rand_pix = shell_pix[np.random.choice(numpix, num_mocks, replace=False)]
+        theta, phi = hp.pix2ang(nside, rand_pix)
+
+        # convert to standard format
+        rst = rdist * np.sin(theta)
+        mocks[:, 0] = rst * np.cos(phi)
+        mocks[:, 1] = rst * np.sin(phi)
+        mocks[:, 2] = rdist * np.cos(theta)
+        mocks[:, 3] = phi * 180. / np.pi
+        mocks[:, 4] = 90 - theta * 180. / np.pi
+        mocks[:, 5] = -1.  # all buffer particles are given redshift -1 to aid identification
+        mocks[:, 6] = 0    # all buffer particles are given weight 0 to aid identification
+        mocks[:, 7] = 0    # all buffer particles are given weight 0 to aid identification
+
+        return mocks, rdist, mask
+
     def generate_buffer(self):
         """Method to generate buffer particles around the edges of survey volume to prevent and detect leakage of
         Voronoi cells outside survey region during the tessellation stage"""
 
-        # set the buffer particle density
-        buffer_dens = self.mock_dens_ratio * self.tracer_dens
-
         # get the survey mask
-        mask = hp.read_map(self.mask_file, verbose=False)
-        nside = hp.get_nside(mask)
-        survey_pix = np.nonzero(mask)[0]
-        numpix = len(survey_pix)
+        mask = self.mask
 
         # estimate the mean inter-particle separation
         mean_nn_distance = self.tracer_dens ** (-1. / 3)
@@ -363,36 +430,8 @@ class ZobovVoids:
         # these choices are somewhat arbitrary, and could be optimized
         r_low = self.cosmo.get_comoving_distance(z_high) + mean_nn_distance * 0.5 #self.mock_dens_ratio ** (-1. / 3)
         r_high = r_low + mean_nn_distance * 1.5
-        cap_volume = self.f_sky * 4. * np.pi * (r_high ** 3. - r_low ** 3.) / 3.
-
-        # how many buffer particles fit in this cap
-        num_high_mocks = int(np.ceil(buffer_dens * cap_volume))
-        high_mocks = np.zeros((num_high_mocks, 8))
-
-        # generate random radial positions within the cap
-        rdist = (r_low ** 3. + (r_high ** 3. - r_low ** 3.) * np.random.rand(num_high_mocks)) ** (1. / 3)
-
-        # generate mock angular positions within the survey mask
-        # NOTE: these are not random positions, since they are all centred in a Healpix pixel
-        # but for buffer particles this is not important (and is generally faster)
-        while num_high_mocks > numpix:
-            # more mock posns required than mask pixels, so upgrade mask to get more pixels
-            nside *= 2
-            mask = hp.ud_grade(mask, nside)
-            survey_pix = np.nonzero(mask)[0]
-            numpix = len(survey_pix)
-        rand_pix = survey_pix[random.sample(range(numpix), num_high_mocks)]
-        theta, phi = hp.pix2ang(nside, rand_pix)
-
-        # convert to standard format
-        high_mocks[:, 0] = rdist * np.sin(theta) * np.cos(phi)
-        high_mocks[:, 1] = rdist * np.sin(theta) * np.sin(phi)
-        high_mocks[:, 2] = rdist * np.cos(theta)
-        high_mocks[:, 3] = phi * 180. / np.pi
-        high_mocks[:, 4] = 90 - theta * 180. / np.pi
-        high_mocks[:, 5] = -1  # all buffer particles are given redshift -1 to aid identification
-        high_mocks[:, 6] = 0   # all buffer particles are given weight 0 to aid identification
-        high_mocks[:, 7] = 0   # all buffer particles are given weight 0 to aid identification
+        high_mocks, rdist, mask = self.generate_shell_mocks(r_low, r_high, mask, self.f_sky)
+        num_high_mocks = len(high_mocks)
 
         # farthest buffer particle
         self.r_far = np.max(rdist)
@@ -415,35 +454,8 @@ class ZobovVoids:
                 r_high = self.cosmo.get_comoving_distance(z_low)
             if r_low < 0:
                 r_low = 0
-            cap_volume = self.f_sky * 4. * np.pi * (r_high ** 3. - r_low ** 3.) / 3.
-
-            # how many buffer particles fit in this cap
-            num_low_mocks = int(np.ceil(buffer_dens * cap_volume))
-            low_mocks = np.zeros((num_low_mocks, 8))
-
-            # generate random radial positions within the cap
-            rdist = (r_low ** 3. + (r_high ** 3. - r_low ** 3.) * np.random.rand(num_low_mocks)) ** (1. / 3)
-
-            # generate mock angular positions within the survey mask
-            # same as above -- these are not truly random but that's ok
-            while num_low_mocks > numpix:
-                # more mock posns required than mask pixels, so upgrade mask to get more pixels
-                nside *= 2
-                mask = hp.ud_grade(mask, nside)
-                survey_pix = np.nonzero(mask)[0]
-                numpix = len(survey_pix)
-            rand_pix = survey_pix[random.sample(range(numpix), num_low_mocks)]
-            theta, phi = hp.pix2ang(nside, rand_pix)
-
-            # convert to standard format
-            low_mocks[:, 0] = rdist * np.sin(theta) * np.cos(phi)
-            low_mocks[:, 1] = rdist * np.sin(theta) * np.sin(phi)
-            low_mocks[:, 2] = rdist * np.cos(theta)
-            low_mocks[:, 3] = phi * 180. / np.pi
-            low_mocks[:, 4] = 90 - theta * 180. / np.pi
-            low_mocks[:, 5] = -1.  # all buffer particles are given redshift -1 to aid later identification
-            low_mocks[:, 6] = 0    # all buffer particles are given weight 0 to aid identification
-            low_mocks[:, 7] = 0    # all buffer particles are given weight 0 to aid identification
+            low_mocks, rdist, mask = self.generate_shell_mocks(r_low, r_high, mask, self.f_sky)
+            num_low_mocks = len(low_mocks)
 
             # closest buffer particle
             self.r_near = np.min(rdist)
@@ -461,45 +473,13 @@ class ZobovVoids:
 
         # ------ Step 3: buffer particles along the survey edges-------- #
         if self.f_sky < 1.0:
-            # get the survey boundary
+            # get the survey boundary, in which the buffer mocks will be placed
             boundary = self.find_mask_boundary()
+            boundary_f_sky = 1.0 * np.count_nonzero(boundary) / len(boundary)
 
-            # where we will place the buffer mocks
-            boundary_pix = np.nonzero(boundary)[0]
-            numpix = len(boundary_pix)
-            boundary_f_sky = 1.0 * len(boundary_pix) / len(boundary)
-            boundary_nside = hp.get_nside(boundary)
-
-            # how many buffer particles
-            # boundary_volume = boundary_f_sky * 4. * np.pi * (self.r_far ** 3. - self.r_near ** 3.) / 3.
-            boundary_volume = boundary_f_sky * 4. * np.pi * quad(lambda y: y ** 2, self.r_near, self.r_far)[0]
-            num_bound_mocks = int(np.ceil(buffer_dens * boundary_volume))
-            bound_mocks = np.zeros((num_bound_mocks, 8))
-
-            # generate random radial positions within the boundary layer
-            rdist = (self.r_near ** 3. + (self.r_far ** 3. - self.r_near ** 3.) *
-                     np.random.rand(num_bound_mocks)) ** (1. / 3)
-
-            # generate mock angular positions within the boundary layer
-            # and same as above -- not truly random, but ok
-            while num_bound_mocks > numpix:
-                # more mocks required than pixels in which to place them, so upgrade mask
-                boundary_nside *= 2
-                boundary = hp.ud_grade(boundary, boundary_nside)
-                boundary_pix = np.nonzero(boundary)[0]
-                numpix = len(boundary_pix)
-            rand_pix = boundary_pix[random.sample(range(numpix), num_bound_mocks)]
-            theta, phi = hp.pix2ang(boundary_nside, rand_pix)
-
-            # convert to standard format
-            bound_mocks[:, 0] = rdist * np.sin(theta) * np.cos(phi)
-            bound_mocks[:, 1] = rdist * np.sin(theta) * np.sin(phi)
-            bound_mocks[:, 2] = rdist * np.cos(theta)
-            bound_mocks[:, 3] = phi * 180. / np.pi
-            bound_mocks[:, 4] = 90 - theta * 180. / np.pi
-            bound_mocks[:, 5] = -1.  # all buffer particles are given redshift -1 to aid identification
-            bound_mocks[:, 6] = 0    # all buffer particles are given weight 0 to aid identification
-            bound_mocks[:, 7] = 0    # all buffer particles are given weight 0 to aid identification
+            bound_mocks, rdist, boundary = self.generate_shell_mocks(self.r_near, self.r_far,
+                                                                     boundary, boundary_f_sky)
+            num_bound_mocks = len(bound_mocks)
 
             if self.verbose:
                 print("\tplaced %d buffer mocks along the survey boundary edges" % num_bound_mocks)
@@ -521,20 +501,21 @@ class ZobovVoids:
         # (strictly speaking, this gives a lot of redundancy as the box is very big;
         # but it doesn't slow the tessellation too much and keeps coding simpler)
 
-        # generate guard particle positions
-        x = np.linspace(0.1, self.box_length - 0.1, self.guard_nums)
-        guards = np.vstack(np.meshgrid(x, x, x)).reshape(3, -1).T
+        # generate guard particle positions on a regular lattice
+        lo, hi = 0.1, self.box_length - 0.1
+        ngrid = self.guard_nums * 1j  # imaginary step = number of points, see np.mgrid docs
+        guards = np.mgrid[lo:hi:ngrid, lo:hi:ngrid, lo:hi:ngrid].reshape(3, -1).T
 
         # make a kdTree instance using all the galaxies and buffer mocks
         all_posns_obs = np.vstack([self.tracers[:, :3], buffers[:, :3]])
         # positions in Zobov box coordinates
         all_posns_box = self.obs2zobovbox(all_posns_obs)
-        tree = cKDTree(all_posns_box, boxsize=self.box_length)
+        # the tree answers only one batch of guard queries, so skip the
+        # sliding-midpoint balancing to speed up construction
+        tree = cKDTree(all_posns_box, boxsize=self.box_length, balanced_tree=False)
 
         # find the nearest neighbour distance for each of the guard particles
-        nn_dist = np.empty(len(guards))
-        for i in range(len(guards)):
-            nn_dist[i], nnind = tree.query(guards[i, :], k=1)
+        nn_dist, nnind = tree.query(guards, k=1, workers=-1)
 
         # drop all guards that are too close to existing points
         guards = guards[nn_dist > (self.box_length - 0.2) / self.guard_nums]
@@ -582,13 +563,12 @@ class ZobovVoids:
             print('Determining survey redshift selection function ...')
         sys.stdout.flush()
 
-        # first determine the equal volume bins
-        r_near = self.cosmo.get_comoving_distance(self.z_min)
-        r_far = self.cosmo.get_comoving_distance(self.z_max)
-        rvals = np.linspace(r_near ** 3, r_far ** 3, nbins + 1)
-        rvals = rvals ** (1. / 3)
+        # first determine the equal volume bins, reusing the distances to z_min and z_max
+        # already computed in __init__
+        rcubed = np.linspace(self.r_near ** 3, self.r_far ** 3, nbins + 1)
+        rvals = rcubed ** (1. / 3)
         zsteps = self.cosmo.get_redshift(rvals)
-        volumes = self.f_sky * 4 * np.pi * (rvals[1:] ** 3. - rvals[:-1] ** 3.) / 3.
+        volumes = self.f_sky * 4 * np.pi * np.diff(rcubed) / 3.
         # (all elements of volumes should be equal)
 
         # get the tracer galaxy redshifts
@@ -616,26 +596,13 @@ class ZobovVoids:
         :return:
         """
 
-        with open(self.posn_file, 'w') as F:
+        # file layout is column-sequential: all x values, then all y, etc.
+        ncols = 3 if self.is_box else 8
+        with open(self.posn_file, 'wb') as F:
             npart = np.array(self.num_part_total, dtype=np.int32)
-            npart.tofile(F, format='%d')
-            data = self.tracers[:, 0]
-            data.tofile(F, format='%f')
-            data = self.tracers[:, 1]
-            data.tofile(F, format='%f')
-            data = self.tracers[:, 2]
-            data.tofile(F, format='%f')
-            if not self.is_box:  # write RA, Dec, redshift, weights and completeness info too
-                data = self.tracers[:, 3]
-                data.tofile(F, format='%f')
-                data = self.tracers[:, 4]
-                data.tofile(F, format='%f')
-                data = self.tracers[:, 5]
-                data.tofile(F, format='%f')
-                data = self.tracers[:, 6]
-                data.tofile(F, format='%f')
-                data = self.tracers[:, 7]
-                data.tofile(F, format='%f')
+            npart.tofile(F)
+            data = np.ascontiguousarray(self.tracers[:, :ncols].T)
+            data.tofile(F)
 
     def delete_tracer_info(self):
         """
@@ -649,21 +616,16 @@ class ZobovVoids:
         re-reads tracer information from Zobov-formatted file if required after previous deletion
         """
 
+        ncols = 3 if self.is_box else 8
         self.tracers = np.empty((self.num_part_total, 8))
-        with open(self.posn_file, 'r') as F:
+        with open(self.posn_file, 'rb') as F:
             nparts = np.fromfile(F, dtype=np.int32, count=1)[0]
             if not nparts == self.num_part_total:  # sanity check
                 sys.exit("nparts = %d in %s_pos.dat file does not match num_part_total = %d!"
                          % (nparts, self.handle, self.num_part_total))
-            self.tracers[:, 0] = np.fromfile(F, dtype=np.float64, count=nparts)
-            self.tracers[:, 1] = np.fromfile(F, dtype=np.float64, count=nparts)
-            self.tracers[:, 2] = np.fromfile(F, dtype=np.float64, count=nparts)
-            if not self.is_box:
-                self.tracers[:, 3] = np.fromfile(F, dtype=np.float64, count=nparts)
-                self.tracers[:, 4] = np.fromfile(F, dtype=np.float64, count=nparts)
-                self.tracers[:, 5] = np.fromfile(F, dtype=np.float64, count=nparts)
-                self.tracers[:, 6] = np.fromfile(F, dtype=np.float64, count=nparts)
-                self.tracers[:, 7] = np.fromfile(F, dtype=np.float64, count=nparts)
+            # file layout is column-sequential, so read everything at once and transpose
+            data = np.fromfile(F, dtype=np.float64, count=nparts * ncols)
+            self.tracers[:, :ncols] = data.reshape((ncols, nparts)).T
 
     def write_config(self):
         """method to write configuration information for the ZOBOV run to file for later lookup"""
@@ -755,8 +717,7 @@ class ZobovVoids:
                     sys.exit("Something went wrong with the tessellation. Aborting ...")
 
                 # ---Step 5: copy the .vol files to .trvol--- #
-                cmd = ["cp", "%s.vol" % self.handle, "%s.trvol" % self.handle]
-                subprocess.call(cmd)
+                shutil.copyfile("%s.vol" % self.handle, "%s.trvol" % self.handle)
 
             else:  # no PBC, so use vozisol
                 print("Calling vozisol to do the tessellation...")
@@ -795,8 +756,7 @@ class ZobovVoids:
                 return 0
 
             # ---Step 4: copy the .vol files to .trvol--- #
-            cmd = ["cp", "%s.vol" % self.handle, "%s.trvol" % self.handle]
-            subprocess.call(cmd)
+            shutil.copyfile("%s.vol" % self.handle, "%s.trvol" % self.handle)
 
             # ---Step 5: if buffer mocks were used, remove them and flag edge galaxies--- #
             # (necessary because voz1b1 and voztie do not do this automatically)
@@ -814,8 +774,7 @@ class ZobovVoids:
         if self.is_box:
             # no preparation is required for void-finding
             if self.find_clusters:
-                cmd = ["cp", "%s.vol" % self.handle, "%sc.vol" % self.handle]
-                subprocess.call(cmd)
+                shutil.copyfile("%s.vol" % self.handle, "%sc.vol" % self.handle)
         else:
             # we need to account for buffer mocks, selection effects and systematics on relative densities
             # Voronoi volumes were calculated in units of the mean of all particles; we first change this to units of
@@ -824,16 +783,16 @@ class ZobovVoids:
             # (if desired). Original Voronoi volumes are also kept to calculate void volumes in correct units
 
             # ---Step 1: read the edge-modified Voronoi volumes--- #
-            with open('./%s.vol' % self.handle, 'r') as F:
+            with open('./%s.vol' % self.handle, 'rb') as F:
                 npreal = np.fromfile(F, dtype=np.int32, count=1)[0]
                 modvols = np.fromfile(F, dtype=np.float64, count=npreal)
 
             # ---Step 2: renormalize volumes in units of mean volume per galaxy--- #
             # (this step is necessary because otherwise the buffer mocks and bounding box affect the calculation)
             edgemask = modvols == 1.0 / 0.9e30  # effectively zero volume / infinite density
-            modvols[np.logical_not(edgemask)] *= (self.tracer_dens * self.box_length ** 3.) / self.num_part_total
+            notedge = np.logical_not(edgemask)
             # check for failures!
-            if np.any(modvols[np.logical_not(edgemask)] == 0):
+            if np.any(modvols[notedge] == 0):
                 sys.exit('Tessellation gave some zero-volume Voronoi cells - check log file!!\nAborting...')
 
             # Basic principle in next few steps is that the cell density relative to local mean is the inverse of the
@@ -841,55 +800,58 @@ class ZobovVoids:
             # relative volume to compensate and vice versa. Cell volumes are also adjusted by the inverse of systematic
             # weights.
 
+            # accumulate all the scale factors for the non-edge cells first, then apply them to
+            # the volumes with a single masked multiply at the end
+            modfactors = np.full(np.count_nonzero(notedge),
+                                 (self.tracer_dens * self.box_length ** 3.) / self.num_part_total)
+
             # ---Step 3: scale volumes accounting for z-dependent selection--- #
             if self.use_z_wts:
                 redshifts = self.tracers[:self.num_tracers, 5]
                 selfnbins = np.loadtxt(self.selection_fn_file)
-                selfn = InterpolatedUnivariateSpline(selfnbins[:, 0], selfnbins[:, 2], k=1)
                 # smooth with a Savitzky-Golay filter to remove high-frequency noise
                 x = np.linspace(redshifts.min(), redshifts.max(), 1000)
-                y = savgol_filter(selfn(x), 101, 3)
+                y = savgol_filter(np.interp(x, selfnbins[:, 0], selfnbins[:, 2]), 101, 3)
                 # then linearly interpolate the filtered interpolation
                 selfn = InterpolatedUnivariateSpline(x, y, k=1)
-                # scale the cell volumes
-                modfactors = selfn(redshifts[np.logical_not(edgemask)])
-                modvols[np.logical_not(edgemask)] *= modfactors
+                modfactors *= selfn(redshifts[notedge])
                 # check for failures!
-                if np.any(modvols[np.logical_not(edgemask)] == 0):
+                if np.any(modfactors == 0):
                     sys.exit('Use of z-weights caused some zero-volume Voronoi cells - check input!!\nAborting...')
 
             # ---Step 4: scale volumes to account for systematics weights--- #
             if self.use_syst_wts:
-                modfactors = self.tracers[:self.num_tracers, 6]
-                # note division in next step
-                modvols[np.logical_not(edgemask)] /= modfactors[np.logical_not(edgemask)]
-                if np.any(modvols[np.logical_not(edgemask)] == 0):
+                # note the division
+                modfactors /= self.tracers[:self.num_tracers, 6][notedge]
+                if np.any(modfactors == 0):
                     sys.exit('Use of systematics weights caused some zero-volume Voronoi cells - check input!!' +
                              '\nAborting...')
 
             # ---Step 5: scale volumes accounting for angular completeness--- #
             if self.use_completeness_wts:
-                modfactors = self.tracers[:self.num_tracers, 7]
-                modvols[np.logical_not(edgemask)] *= modfactors[np.logical_not(edgemask)]
-                if np.any(modvols[np.logical_not(edgemask)] == 0):
+                modfactors *= self.tracers[:self.num_tracers, 7][notedge]
+                if np.any(modfactors == 0):
                     sys.exit('Use of completeness weights caused some zero-volume Voronoi cells - check input!!' +
                              '\nAborting...')
 
+            # apply the combined factors in one pass
+            modvols[notedge] *= modfactors
+
             # ---Step 6: write the scaled volumes to file--- #
-            with open("./%s.vol" % self.handle, 'w') as F:
-                npreal.tofile(F, format="%d")
-                modvols.tofile(F, format="%f")
+            with open("./%s.vol" % self.handle, 'wb') as F:
+                npreal.tofile(F)
+                modvols.tofile(F)
 
             # ---Step 7: if finding clusters, create the files required--- #
             if self.find_clusters:
                 modvols[edgemask] = 0.9e30
                 # and write to c.vol file
-                with open("./%sc.vol" % self.handle, 'w') as F:
-                    npreal.tofile(F, format="%d")
-                    modvols.tofile(F, format="%f")
+                with open("./%sc.vol" % self.handle, 'wb') as F:
+                    npreal.tofile(F)
+                    modvols.tofile(F)
 
             # ---Step 8: set the number of non-edge galaxies--- #
-            self.num_non_edge = self.num_tracers - sum(edgemask)
+            self.num_non_edge = self.num_tracers - np.count_nonzero(edgemask)
 
         # write a config file
         self.write_config()
@@ -898,20 +860,25 @@ class ZobovVoids:
         cmd = [binpath + "jozovtrvol", "v", self.handle, str(0), str(0)]
         logfile = logfolder + self.handle + '-jozov.out'
         log = open(logfile, 'w')
-        subprocess.call(cmd, stdout=log, stderr=log)
-        log.close()
+        jozov_voids = subprocess.Popen(cmd, stdout=log, stderr=log)
         # this call to (modified version of) jozov sets NO density threshold, so ALL voids are merged without limit
         # and the FULL merged void heirarchy is output to file; distinct non-overlapping voids are later
         # obtained in post-processing
 
-        # ---if finding clusters, run jozov again--- #
+        # ---if finding clusters, run jozov again, concurrently with the void-finding pass--- #
+        # (the two passes read different input files and write disjoint outputs, so this is safe;
+        # the vozinit/tessellation/checkedges steps above have strict ordering dependencies and
+        # cannot be overlapped in the same way)
         if self.find_clusters:
             print(" ==== bonus: overdensity-finding with ZOBOV ==== ")
             sys.stdout.flush()
             cmd = [binpath + "jozovtrvol", "c", self.handle, str(0), str(0)]
-            log = open(logfile, 'a')
-            subprocess.call(cmd, stdout=log, stderr=log)
-            log.close()
+            clusterlog = open(logfolder + self.handle + '-jozov-clusters.out', 'w')
+            jozov_clusters = subprocess.Popen(cmd, stdout=clusterlog, stderr=clusterlog)
+            jozov_clusters.wait()
+            clusterlog.close()
+        jozov_voids.wait()
+        log.close()
 
         # ---clean up: remove unnecessary files--- #
         for fileName in glob.glob("./part." + self.handle + ".*"):
@@ -922,11 +889,255 @@ class ZobovVoids:
         if not os.access(raw_dir, os.F_OK):
             os.makedirs(raw_dir)
         for fileName in glob.glob("./" + self.handle + "*"):
-            cmd = ["mv", fileName, "%s." % raw_dir]
-            subprocess.call(cmd)
+            shutil.move(fileName, raw_dir + os.path.basename(fileName))
 
         return 1
 
+    def zone_buckets(self, zonedata):
+        """Groups tracer particle indices by their zone number
+
+        :param zonedata: integer array of zone numbers, one entry per particle
+
+        :returns:
+        ----
+        zone_order: particle indices sorted by zone number
+        zone_starts: index into zone_order at which each zone's particles begin; the member
+                     particles of zone z are zone_order[zone_starts[z]:zone_starts[z + 1]]
+        """
+
+        zone_order = np.argsort(zonedata)
+        zone_sorted = zonedata[zone_order]
+        zone_starts = np.searchsorted(zone_sorted, np.arange(zone_sorted[-1] + 2))
+        return zone_order, zone_starts
+
+    def read_hierarchy_members(self, hierarchy_file, num_struct):
+        """Parses a post-processed .void hierarchy file and returns the member zones of each structure
+
+        :param hierarchy_file: path to the .void hierarchy file
+        :param num_struct: expected number of structures listed in the file
+
+        :return: list of num_struct integer arrays of member zone numbers
+        """
+
+        with open(hierarchy_file, 'r') as FHierarchy:
+            FHierarchy.readline()  # skip the first line, contains total number of structures
+            hierarchy = FHierarchy.readlines()
+
+        members = []
+        for i in range(num_struct):
+            # tokenize the line just once; zone numbers and link densities all parse as floats
+            tokens = np.array(hierarchy[i].split(), dtype=float)
+            member_zones = [int(tokens[0])]
+            pos = 1
+            num_zones_to_add = int(tokens[pos])
+            while num_zones_to_add > 0:
+                member_zones.extend(tokens[pos + 2:pos + num_zones_to_add + 2].astype(int))
+                pos += num_zones_to_add + 2
+                num_zones_to_add = int(tokens[pos])
+            members.append(np.asarray(member_zones, dtype=int))
+        return members
+
+    def read_zone_file(self, zone_file):
+        """Reads a ZOBOV particle-zone membership file
+
+        :param zone_file: path to the .zone file
+
+        :return: integer array of zone numbers, one entry per tracer particle
+        """
+
+        if zone_file not in self.file_cache:
+            # np.fromfile's C text parser is much faster than np.loadtxt on these large single-column files
+            with open(zone_file, 'r') as F:
+                F.readline()  # skip the header line
+                self.file_cache[zone_file] = np.fromfile(F, dtype=int, sep=' ')
+        return self.file_cache[zone_file]
+
+    def read_volumes_file(self, vol_file, reciprocal=False):
+        """Reads a binary ZOBOV volumes (.vol or .trvol) file, caching the result for reuse
+
+        :param vol_file: path to the binary volumes file
+        :param reciprocal: if True, return reciprocal cell volumes (i.e. VTFE densities)
+
+        :return: float array of normalized Voronoi cell volumes (or densities), one entry per tracer particle
+        """
+
+        key = (vol_file, reciprocal)
+        if key not in self.file_cache:
+            with open(vol_file, 'rb') as File:
+                npart = np.fromfile(File, dtype=np.int32, count=1)[0]
+                if not npart == self.num_tracers:  # sanity check
+                    sys.exit('npart = %d in %s does not match num_tracers = %d!'
+                             % (npart, vol_file, self.num_tracers))
+                vols = np.fromfile(File, dtype=np.float64, count=npart)
+            if reciprocal:
+                np.reciprocal(vols, out=vols)
+            self.file_cache[key] = vols
+        return self.file_cache[key]
+
+    def read_list_file(self, list_file):
+        """Reads a whitespace-delimited ZOBOV list file with a two-line header
+
+        :param list_file: path to the .txt list file
+
+        :return: 2D float array of the tabulated file contents
+        """
+
+        # np.fromfile's C text parser is much faster than np.loadtxt's python row parsing
+        with open(list_file, 'r') as F:
+            F.readline()  # skip the two header lines
+            F.readline()
+            start = F.tell()
+            ncols = len(F.readline().split())
+            F.seek(start)
+            data = np.fromfile(F, dtype=float, sep=' ')
+        return data.reshape(-1, ncols)
+
+    def prune_structures(self, structsread, hierarchy, sorted_order, zone_order, zone_starts, vols, densities,
+                         voids=True, dont_merge=True, use_r_threshold=False, r_threshold=2.,
+                         use_link_density_threshold=False, link_density_threshold=1., count_all=True,
+                         use_stripping=False, strip_density_threshold=1.):
+        """Separates distinct non-overlapping structures from the raw ZOBOV hierarchy, applying the
+        minimal pruning and (optional) merging criteria shared by postprocess_voids and
+        postprocess_clusters. The voids flag selects between the void and supercluster acceptance
+        criteria and linking density definitions; the remaining keywords correspond to the
+        hard-coded merging parameters set in the callers.
+
+        :param structsread: sorted candidate list, as returned by read_list_file
+        :param hierarchy: hierarchy file lines, without the leading count line
+        :param sorted_order: ordering applied to structsread, for indexing back into hierarchy
+        :param zone_order: particle indices bucketed by zone, from zone_buckets
+        :param zone_starts: per-zone offsets into zone_order, from zone_buckets
+        :param vols: array of Voronoi cell volumes
+        :param densities: array of VTFE cell densities
+        :param voids: True to prune voids, False for superclusters
+
+        :returns:
+        ----
+        new_lines: accepted hierarchy lines for the new .void file
+        newlist_rows: accepted rows for the new _list.txt file
+        accepted_members: list of member zone arrays, one per accepted structure
+        edge_flag: integer array of edge contamination flags for accepted structures
+        wtd_avg_dens: volume-weighted mean member cell density of accepted structures
+        num_acc: number of accepted structures
+        """
+
+        num_structs = len(structsread[:, 0])
+        vid = np.asarray(structsread[:, 0], dtype=int)
+        edgelist = np.asarray(structsread[:, 1], dtype=int)
+        vollist = structsread[:, 4]
+        numpartlist = np.asarray(structsread[:, 5], dtype=int)
+        rlist = structsread[:, 9]
+
+        # direct lookup from zone number to row index in the sorted candidate list
+        zone2index = np.zeros(vid.max() + 1, dtype=int)
+        zone2index[vid] = np.arange(num_structs)
+
+        # mean volume per particle in box (including all buffer mocks)
+        meanvol_trc = (self.box_length ** 3.) / self.num_part_total
+
+        min_num = self.void_min_num if voids else self.cluster_min_num
+
+        # output lines are accumulated in memory for the callers to write in batched calls
+        new_lines = []
+        newlist_rows = []
+        accepted_members = []
+        counted_zones = set()
+        edge_flag = np.zeros(num_structs, dtype=int)
+        wtd_avg_dens = np.zeros(num_structs)
+        num_acc = 0
+
+        for i in range(num_structs):
+            coredens = structsread[i, 3]
+            structline = hierarchy[sorted_order[i]].split()
+            pos = 1
+            num_zones_to_add = int(structline[pos])
+            finalpos = pos + num_zones_to_add + 1
+            rval = float(structline[pos + 1])
+            rstopadd = rlist[i]
+            num_adds = 0
+            if voids:
+                accept = rval >= 1 and coredens < self.min_dens_cut and numpartlist[i] >= min_num
+            else:
+                accept = rval >= 1 and coredens > self.max_dens_cut and numpartlist[i] >= min_num
+            if accept and (count_all or vid[i] not in counted_zones):
+                # this structure passes basic pruning
+                add_more = True
+                num_acc += 1
+                zonelist = [vid[i]]
+                total_vol = vollist[i]
+                total_num_parts = numpartlist[i]
+                zonestoadd = []
+                while num_zones_to_add > 0 and add_more:  # more zones can potentially be added
+                    zonestoadd = np.asarray(structline[pos + 2:pos + num_zones_to_add + 2], dtype=int)
+                    # linking density condition: stay underdense for voids, overdense for clusters
+                    dens = rval * coredens if voids else coredens / rval
+                    link_breached = dens > link_density_threshold if voids else dens < link_density_threshold
+                    subindex = zone2index[zonestoadd]
+                    rsublist = rlist[subindex]
+                    volsublist = vollist[subindex]
+                    partsublist = numpartlist[subindex]
+                    if dont_merge or (use_link_density_threshold and link_breached) or \
+                            (use_r_threshold and max(rsublist) > r_threshold):
+                        # cannot add these zones
+                        rstopadd = rval
+                        add_more = False
+                        finalpos -= (num_zones_to_add + 1)
+                    else:
+                        # keep adding zones
+                        zonelist.extend(zonestoadd)
+                        num_adds += num_zones_to_add
+                        total_vol += np.sum(volsublist)
+                        total_num_parts += np.sum(partsublist)
+                    pos += num_zones_to_add + 2
+                    num_zones_to_add = int(structline[pos])
+                    rval = float(structline[pos + 1])
+                    if add_more:
+                        finalpos = pos + num_zones_to_add + 1
+
+                zonelist = np.atleast_1d(np.asarray(zonelist, dtype=int))
+                counted_zones.update(zonelist)
+                accepted_members.append(zonelist)
+
+                # gather the member particles of the accepted zones from the buckets
+                member_ids = np.concatenate([zone_order[zone_starts[z]:zone_starts[z + 1]]
+                                             for z in zonelist])
+                if voids:
+                    if use_stripping:
+                        member_ids = member_ids[densities[member_ids] < strip_density_threshold]
+                elif not use_stripping:
+                    member_ids = member_ids[densities[member_ids] > strip_density_threshold]
+
+                # if using "stripping" functionality, recalculate volume and number of particles
+                if use_stripping:
+                    total_vol = np.sum(vols[member_ids])
+                    total_num_parts = len(member_ids)
+
+                # check if the structure is edge-contaminated (useful for observational surveys only)
+                if 1 in edgelist[zone2index[np.asarray(zonestoadd, dtype=int)]]:
+                    edge_flag[num_acc - 1] = 1
+
+                # average density of member cells weighted by cell volumes
+                member_vols = vols[member_ids]
+                wtd_avg_dens[num_acc - 1] = np.dot(densities[member_ids], member_vols) / np.sum(member_vols)
+
+                # set the new line for the output .void file
+                newstructline = structline[:finalpos]
+                if not add_more:
+                    newstructline.append(str(0))
+                newstructline.append(str(rstopadd))
+                new_lines.append('\t'.join(newstructline) + '\t\n')
+                if rstopadd > 10 ** 20:
+                    rstopadd = -1  # only structures entirely surrounded by edge particles
+                # row for the output _list.txt file
+                newlist_rows.append((vid[i], int(structsread[i, 2]), coredens, int(structsread[i, 5]), num_adds + 1,
+                                     total_num_parts, total_vol * meanvol_trc, rstopadd))
+
+        # trim the per-structure arrays to the accepted structures only
+        edge_flag = edge_flag[:num_acc]
+        wtd_avg_dens = wtd_avg_dens[:num_acc]
+
+        return new_lines, newlist_rows, accepted_members, edge_flag, wtd_avg_dens, num_acc
+
     def postprocess_voids(self):
         """
         Method to post-process raw ZOBOV output to obtain discrete set of non-overlapping voids. This method
@@ -968,17 +1179,12 @@ class ZobovVoids:
         new_list_file = self.output_folder + self.void_prefix + "_list.txt"
 
         # load the list of void candidates
-        voidsread = np.loadtxt(list_file, skiprows=2)
+        voidsread = self.read_list_file(list_file)
         # sort in ascending order of minimum dens
         sorted_order = np.argsort(voidsread[:, 3])
         voidsread = voidsread[sorted_order]
 
         num_voids = len(voidsread[:, 0])
-        vid = np.asarray(voidsread[:, 0], dtype=int)
-        edgelist = np.asarray(voidsread[:, 1], dtype=int)
-        vollist = voidsread[:, 4]
-        numpartlist = np.asarray(voidsread[:, 5], dtype=int)
-        rlist = voidsread[:, 9]
 
         # load the void hierarchy
         with open(void_file, 'r') as Fvoid:
@@ -989,130 +1195,30 @@ class ZobovVoids:
             sys.exit('Unequal void numbers in voidfile and listfile, %d and %d!' % (nvoids, num_voids))
         hierarchy = hierarchy[1:]
 
-        # load the particle-zone info
-        zonedata = np.loadtxt(zone_file, dtype='int', skiprows=1)
+        # load the particle-zone info, bucketed by zone for fast member lookups
+        zonedata = self.read_zone_file(zone_file)
+        zone_order, zone_starts = self.zone_buckets(zonedata)
 
         # load the VTFE volume information
-        with open(volumes_file, 'r') as File:
-            npart = np.fromfile(File, dtype=np.int32, count=1)[0]
-            if not npart == self.num_tracers:  # sanity check
-                sys.exit('npart = %d in %s.trvol file does not match num_tracers = %d!'
-                         % (npart, self.handle, self.num_tracers))
-            vols = np.fromfile(File, dtype=np.float64, count=npart)
+        vols = self.read_volumes_file(volumes_file)
 
         # load the VTFE density information
-        with open(densities_file, 'r') as File:
-            npart = np.fromfile(File, dtype=np.int32, count=1)[0]
-            if not npart == self.num_tracers:  # sanity check
-                sys.exit("npart = %d in %s.vol file does not match num_tracers = %d!"
-                         % (npart, self.handle, self.num_tracers))
-            densities = np.fromfile(File, dtype=np.float64, count=npart)
-            densities = 1. / densities
-
-        # mean volume per particle in box (including all buffer mocks)
-        meanvol_trc = (self.box_length ** 3.) / self.num_part_total
+        densities = self.read_volumes_file(densities_file, reciprocal=True)
 
         # parse the list of structures, separating distinct voids and performing minimal pruning
+        newvoid_lines, newlist_rows, accepted_members, edge_flag, wtd_avg_dens, num_acc = self.prune_structures(
+            voidsread, hierarchy, sorted_order, zone_order, zone_starts, vols, densities, voids=True,
+            dont_merge=dont_merge, use_r_threshold=use_r_threshold, r_threshold=r_threshold,
+            use_link_density_threshold=use_link_density_threshold, link_density_threshold=link_density_threshold,
+            count_all=count_all_voids, use_stripping=use_stripping, strip_density_threshold=strip_density_threshold)
+
+        # write the new .void file, first line contains the number of voids
         with open(new_void_file, 'w') as Fnewvoid:
-            with open(new_list_file, 'w') as Fnewlist:
-
-                # initialize variables
-                counted_zones = np.empty(0, dtype=int)
-                edge_flag = np.empty(0, dtype=int)
-                wtd_avg_dens = np.empty(0, dtype=int)
-                num_acc = 0
-
-                for i in range(num_voids):
-                    coredens = voidsread[i, 3]
-                    voidline = hierarchy[sorted_order[i]].split()
-                    pos = 1
-                    num_zones_to_add = int(voidline[pos])
-                    finalpos = pos + num_zones_to_add + 1
-                    rval = float(voidline[pos + 1])
-                    rstopadd = rlist[i]
-                    num_adds = 0
-                    if rval >= 1 and coredens < self.min_dens_cut and numpartlist[i] >= self.void_min_num \
-                            and (count_all_voids or vid[i] not in counted_zones):
-                        # this void passes basic pruning
-                        add_more = True
-                        num_acc += 1
-                        zonelist = vid[i]
-                        total_vol = vollist[i]
-                        total_num_parts = numpartlist[i]
-                        zonestoadd = []
-                        while num_zones_to_add > 0 and add_more:  # more zones can potentially be added
-                            zonestoadd = np.asarray(voidline[pos + 2:pos + num_zones_to_add + 2], dtype=int)
-                            dens = rval * coredens
-                            rsublist = rlist[np.in1d(vid, zonestoadd)]
-                            volsublist = vollist[np.in1d(vid, zonestoadd)]
-                            partsublist = numpartlist[np.in1d(vid, zonestoadd)]
-                            if dont_merge or (use_link_density_threshold and dens > link_density_threshold) or \
-                                    (use_r_threshold > 0 and max(rsublist) > r_threshold):
-                                # cannot add these zones
-                                rstopadd = rval
-                                add_more = False
-                                finalpos -= (num_zones_to_add + 1)
-                            else:
-                                # keep adding zones
-                                zonelist = np.append(zonelist, zonestoadd)
-                                num_adds += num_zones_to_add
-                                total_vol += np.sum(volsublist)  #
-                                total_num_parts += np.sum(partsublist)  #
-                            pos += num_zones_to_add + 2
-                            num_zones_to_add = int(voidline[pos])
-                            rval = float(voidline[pos + 1])
-                            if add_more:
-                                finalpos = pos + num_zones_to_add + 1
-
-                        counted_zones = np.append(counted_zones, zonelist)
-                        if use_stripping:
-                            member_ids = np.logical_and(densities[:] < strip_density_threshold,
-                                                        np.in1d(zonedata, zonelist))
-                        else:
-                            member_ids = np.in1d(zonedata, zonelist)
-
-                        # if using void "stripping" functionality, recalculate void volume and number of particles
-                        if use_stripping:
-                            total_vol = np.sum(vols[member_ids])
-                            total_num_parts = len(vols[member_ids])
-
-                        # check if the void is edge-contaminated (useful for observational surveys only)
-                        if 1 in edgelist[np.in1d(vid, zonestoadd)]:
-                            edge_flag = np.append(edge_flag, 1)
-                        else:
-                            edge_flag = np.append(edge_flag, 0)
-
-                        # average density of member cells weighted by cell volumes
-                        w_a_d = np.sum(vols[member_ids] * densities[member_ids]) / np.sum(vols[member_ids])
-                        wtd_avg_dens = np.append(wtd_avg_dens, w_a_d)
-
-                        # set the new line for the .void file
-                        newvoidline = voidline[:finalpos]
-                        if not add_more:
-                            newvoidline.append(str(0))
-                        newvoidline.append(str(rstopadd))
-                        # write line to the output .void file
-                        for j in range(len(newvoidline)):
-                            Fnewvoid.write(newvoidline[j] + '\t')
-                        Fnewvoid.write('\n')
-                        if rstopadd > 10 ** 20:
-                            rstopadd = -1  # only structures entirely surrounded by edge particles
-                        # write line to the output _list.txt file
-                        Fnewlist.write('%d\t%d\t%f\t%d\t%d\t%d\t%f\t%f\n' % (vid[i], int(voidsread[i, 2]), coredens,
-                                                                             int(voidsread[i, 5]), num_adds + 1,
-                                                                             total_num_parts, total_vol * meanvol_trc,
-                                                                             rstopadd))
-
-        # tidy up the files
-        # insert first line with number of voids to the new .void file
-        with open(new_void_file, 'r+') as Fnewvoid:
-            old = Fnewvoid.read()
-            Fnewvoid.seek(0)
-            topline = "%d\n" % num_acc
-            Fnewvoid.write(topline + old)
-
-        # insert header to the _list.txt file
-        listdata = np.loadtxt(new_list_file)
+            Fnewvoid.write("%d\n" % num_acc)
+            Fnewvoid.writelines(newvoid_lines)
+
+        # write the _list.txt file directly from the accumulated rows
+        listdata = np.asarray(newlist_rows)
         header = '%d non-edge tracers in %s, %d voids\n' % (self.num_non_edge, self.handle, num_acc)
         header = header + 'VoidID CoreParticle CoreDens Zone#Parts Void#Zones Void#Parts VoidVol(Mpc/h^3) VoidDensRatio'
         np.savetxt(new_list_file, listdata, fmt='%d %d %0.6f %d %d %d %0.6f %0.6f', header=header)
@@ -1145,13 +1251,7 @@ class ZobovVoids:
         info_file = self.output_folder + self.void_prefix + "_cat.txt"
 
         # load the VTFE density information
-        with open(densities_file, 'r') as File:
-            npart = np.fromfile(File, dtype=np.int32, count=1)[0]
-            if not npart == self.num_tracers:  # sanity check
-                sys.exit("npart = %d in %s.vol file does not match num_tracers = %d!"
-                         % (npart, self.handle, self.num_tracers))
-            densities = np.fromfile(File, dtype=np.float64, count=npart)
-            densities = 1. / densities
+        densities = self.read_volumes_file(densities_file, reciprocal=True)
 
         # check whether tracer information is present, re-read in if required
         if not len(self.tracers) == self.num_part_total:
@@ -1164,31 +1264,43 @@ class ZobovVoids:
         corepart = np.asarray(list_array[:, 1], dtype=int)
 
         # read and assign adjacencies from ZOBOV output
-        with open(adjacency_file, 'r') as AdjFile:
+        with open(adjacency_file, 'rb') as AdjFile:
             npfromadj = np.fromfile(AdjFile, dtype=np.int32, count=1)[0]
             if not npfromadj == self.num_tracers:
                 sys.exit("npart = %d from adjacency file does not match num_tracers = %d!"
                          % (npfromadj, self.num_tracers))
-            partadjs = [[] for i in range(npfromadj)]  # list of lists to record adjacencies - is there a better way?
-            partadjcount = np.zeros(npfromadj, dtype=np.int32)  # counter to monitor adjacencies
             nadj = np.fromfile(AdjFile, dtype=np.int32, count=npfromadj)  # number of adjacencies for each particle
-            # load up the adjacencies from ZOBOV output
-            for i in range(npfromadj):
-                numtomatch = np.fromfile(AdjFile, dtype=np.int32, count=1)[0]
-                if numtomatch > 0:
-                    # particle numbers of adjacent particles
-                    adjpartnumbers = np.fromfile(AdjFile, dtype=np.int32, count=numtomatch)
-                    # keep track of how many adjacencies had already been assigned
-                    oldcount = partadjcount[i]
-                    newcount = oldcount + len(adjpartnumbers)
-                    partadjcount[i] = newcount
-                    # and now assign new adjacencies
-                    partadjs[i][oldcount:newcount] = adjpartnumbers
-                    # now also assign the reverse adjacencies
-                    # (ZOBOV records only (i adj j) or (j adj i), not both)
-                    for index in adjpartnumbers:
-                        partadjs[index].append(i)
-                    partadjcount[adjpartnumbers] += 1
+            # slurp the remaining variable-length records in a single read and parse in memory,
+            # instead of making two small fromfile calls per particle
+            records = np.fromfile(AdjFile, dtype=np.int32)
+
+        # store adjacency lists in flat CSR-style arrays: the neighbours of particle i
+        # sit in adj_flat[adj_offsets[i]:adj_offsets[i + 1]]
+        adj_offsets = np.zeros(npfromadj + 1, dtype=np.int64)
+        adj_offsets[1:] = np.cumsum(nadj)
+        adj_flat = np.empty(adj_offsets[-1], dtype=np.int32)
+        adj_fill = np.zeros(npfromadj, dtype=np.int64)  # counter to monitor adjacencies
+        # load up the adjacencies from ZOBOV output
+        ptr = 0
+        for i in range(npfromadj):
+            numtomatch = records[ptr]
+            ptr += 1
+            if numtomatch > 0:
+                # particle numbers of adjacent particles
+                adjpartnumbers = records[ptr:ptr + numtomatch]
+                ptr += numtomatch
+                # assign the new adjacencies
+                start = adj_offsets[i] + adj_fill[i]
+                adj_flat[start:start + numtomatch] = adjpartnumbers
+                adj_fill[i] += numtomatch
+                # now also assign the reverse adjacencies
+                # (ZOBOV records only (i adj j) or (j adj i), not both)
+                adj_flat[adj_offsets[adjpartnumbers] + adj_fill[adjpartnumbers]] = i
+                adj_fill[adjpartnumbers] += 1
+
+        # sort each particle's neighbour list, so that intersections below can use binary search
+        rows = np.repeat(np.arange(npfromadj, dtype=np.int64), nadj)
+        adj_flat = adj_flat[np.lexsort((adj_flat, rows))]
 
         if self.is_box:
             info_output = np.zeros((num_struct, 9))
@@ -1196,64 +1308,61 @@ class ZobovVoids:
             info_output = np.zeros((num_struct, 11))
         circumcentres = np.empty((num_struct, 3))
         eff_rad = (3.0 * list_array[:, 6] / (4 * np.pi)) ** (1.0 / 3)
+        vertex_pos = np.zeros((4, 3))  # scratch buffer for the tetrahedron vertices, reused per void
+        # preallocated buffers for the bordered circumcentre linear system; the constant
+        # border of ones and zeros is set once, only the 4x4 block changes per void
+        a = np.zeros((5, 5))
+        a[4, :4] = 1.
+        a[:4, 4] = 1.
+        b = np.ones(5)
 
         # loop over void cores, calculating circumcentres and writing to file
         for i in range(num_struct):
             # get adjacencies of the core particle
-            coreadjs = partadjs[corepart[i]]
+            core = corepart[i]
+            coreadjs = adj_flat[adj_offsets[core]:adj_offsets[core + 1]]
             adj_dens = densities[coreadjs]
 
             # get the 3 lowest density mutually adjacent neighbours of the core particle
             first_nbr = coreadjs[np.argmin(adj_dens)]
-            mutualadjs = np.intersect1d(coreadjs, partadjs[first_nbr], assume_unique=True)
+            mutualadjs = sorted_intersect1d(coreadjs, adj_flat[adj_offsets[first_nbr]:adj_offsets[first_nbr + 1]])
             if len(mutualadjs) == 0:
-                circumcentres[i] = np.asarray([0, 0, 0])
+                circumcentres[i] = 0
                 edge_flag[i] = 2
             else:
                 mutualadj_dens = densities[mutualadjs]
                 second_nbr = mutualadjs[np.argmin(mutualadj_dens)]
-                finaladjs = np.intersect1d(mutualadjs, partadjs[second_nbr], assume_unique=True)
+                finaladjs = sorted_intersect1d(mutualadjs, adj_flat[adj_offsets[second_nbr]:adj_offsets[second_nbr + 1]])
                 if len(finaladjs) == 0:  # something has gone wrong at tessellation stage!
-                    circumcentres[i] = np.asarray([0, 0, 0])
+                    circumcentres[i] = 0
                     edge_flag[i] = 2
                 else:  # can calculate circumcentre position
                     finaladj_dens = densities[finaladjs]
                     third_nbr = finaladjs[np.argmin(finaladj_dens)]
 
                     # collect positions of the vertices
-                    vertex_pos = np.zeros((4, 3))
                     vertex_pos[0, :] = positions[corepart[i], :]
                     vertex_pos[1, :] = positions[first_nbr, :]
                     vertex_pos[2, :] = positions[second_nbr, :]
                     vertex_pos[3, :] = positions[third_nbr, :]
-                    if self.is_box:  # need to adjust for periodic BC
-                        shift_inds = abs(vertex_pos[0, 0] - vertex_pos[:, 0]) > self.box_length / 2.0
-                        vertex_pos[shift_inds, 0] += self.box_length * np.sign(vertex_pos[0, 0] -
-                                                                               vertex_pos[shift_inds, 0])
-                        shift_inds = abs(vertex_pos[0, 1] - vertex_pos[:, 1]) > self.box_length / 2.0
-                        vertex_pos[shift_inds, 1] += self.box_length * np.sign(vertex_pos[0, 1] -
-                                                                               vertex_pos[shift_inds, 1])
-                        shift_inds = abs(vertex_pos[0, 2] - vertex_pos[:, 2]) > self.box_length / 2.0
-                        vertex_pos[shift_inds, 2] += self.box_length * np.sign(vertex_pos[0, 2] -
-                                                                               vertex_pos[shift_inds, 2])
+                    if self.is_box:  # need to adjust for periodic BC, all three axes at once
+                        deltas = vertex_pos[0] - vertex_pos
+                        shift_inds = np.abs(deltas) > self.box_length / 2.0
+                        vertex_pos[shift_inds] += self.box_length * np.sign(deltas[shift_inds])
 
                     # solve for the circumcentre; for more details on this method and its stability,
                     # see http://www.ics.uci.edu/~eppstein/junkyard/circumcentre.html
-                    a = np.bmat([[2 * np.dot(vertex_pos, vertex_pos.T), np.ones((4, 1))],
-                                 [np.ones((1, 4)), np.zeros((1, 1))]])
-                    b = np.hstack((np.sum(vertex_pos * vertex_pos, axis=1), np.ones((1))))
+                    np.matmul(vertex_pos, vertex_pos.T, out=a[:4, :4])
+                    a[:4, :4] *= 2
+                    b[:4] = np.sum(vertex_pos * vertex_pos, axis=1)
                     x = np.linalg.solve(a, b)
                     bary_coords = x[:-1]
                     circumcentres[i, :] = np.dot(bary_coords, vertex_pos)
 
-            if self.is_box:
-                # put centre coords back within the fiducial box if they have leaked out
-                if circumcentres[i, 0] < 0 or circumcentres[i, 0] > self.box_length:
-                    circumcentres[i, 0] -= self.box_length * np.sign(circumcentres[i, 0])
-                if circumcentres[i, 1] < 0 or circumcentres[i, 1] > self.box_length:
-                    circumcentres[i, 1] -= self.box_length * np.sign(circumcentres[i, 1])
-                if circumcentres[i, 2] < 0 or circumcentres[i, 2] > self.box_length:
-                    circumcentres[i, 2] -= self.box_length * np.sign(circumcentres[i, 2])
+        if self.is_box:
+            # put centre coords back within the fiducial box if they have leaked out
+            outside = np.logical_or(circumcentres < 0, circumcentres > self.box_length)
+            circumcentres[outside] -= self.box_length * np.sign(circumcentres[outside])
 
         info_output[:, 0] = v_id
         info_output[:, 4] = eff_rad
@@ -1271,14 +1380,15 @@ class ZobovVoids:
             centre_dec = 90 - np.degrees((np.arccos(centre_obs[:, 2] / rdist)))
             centre_ra = np.degrees(np.arctan2(centre_obs[:, 1], centre_obs[:, 0]))
             centre_ra[centre_ra < 0] += 360
-            mask = hp.read_map(self.mask_file, verbose=False)
+            mask = self.mask
             nside = hp.get_nside(mask)
             pixel = hp.ang2pix(nside, np.deg2rad(90 - centre_dec), np.deg2rad(centre_ra))
-            centre_redshifts[mask[pixel] == 0] = -1
-            centre_dec[mask[pixel] == 0] = -60
-            centre_ra[mask[pixel] == 0] = -60
-            eff_angrad[mask[pixel] == 0] = 0
-            edge_flag[mask[pixel] == 0] = 2
+            off_mask = mask[pixel] == 0
+            centre_redshifts[off_mask] = -1
+            centre_dec[off_mask] = -60
+            centre_ra[off_mask] = -60
+            eff_angrad[off_mask] = 0
+            edge_flag[off_mask] = 2
             out_of_redshift = np.logical_or(centre_redshifts < self.z_min, centre_redshifts > self.z_max)
             centre_redshifts[out_of_redshift] = -1
             centre_dec[out_of_redshift] = -60
@@ -1330,25 +1440,15 @@ class ZobovVoids:
         list_file = self.output_folder + self.void_prefix + '_list.txt'
         info_file = self.output_folder + 'barycentres/' + self.void_prefix + '_baryC_cat.txt'
 
-        # load up the particle-zone info
-        zonedata = np.loadtxt(zone_file, dtype='int', skiprows=1)
+        # load up the particle-zone info, bucketed by zone for fast member lookups
+        zonedata = self.read_zone_file(zone_file)
+        zone_order, zone_starts = self.zone_buckets(zonedata)
 
         # load the VTFE volume information
-        with open(vol_file, 'r') as File:
-            npart = np.fromfile(File, dtype=np.int32, count=1)[0]
-            if not npart == self.num_tracers:  # sanity check
-                sys.exit('npart = %d in %s.trvol file does not match num_tracers = %d!'
-                         % (npart, self.handle, self.num_tracers))
-            vols = np.fromfile(File, dtype=np.float64, count=npart)
+        vols = self.read_volumes_file(vol_file)
 
         # load the VTFE density information
-        with open(dens_file, 'r') as File:
-            npart = np.fromfile(File, dtype=np.int32, count=1)[0]
-            if not npart == self.num_tracers:  # sanity check
-                sys.exit("npart = %d in %s.vol file does not match num_tracers = %d!"
-                         % (npart, self.handle, self.num_tracers))
-            densities = np.fromfile(File, dtype=np.float64, count=npart)
-            densities = 1. / densities
+        densities = self.read_volumes_file(dens_file, reciprocal=True)
 
         # mean volume per particle in box (including all buffer mocks)
         meanvol_trc = (self.box_length ** 3.) / self.num_part_total
@@ -1359,7 +1459,17 @@ class ZobovVoids:
         # extract the x,y,z positions of the galaxies only (no buffer mocks)
         positions = self.tracers[:self.num_tracers, :3]
 
-        list_array = np.loadtxt(list_file, skiprows=2)
+        # per-zone sums computed once over the full arrays; per-structure totals are then
+        # just small gathers over the member zones (not valid if stripping is in use)
+        num_zones = len(zone_starts) - 1
+        zone_vol = np.bincount(zonedata, weights=vols, minlength=num_zones)
+        zone_voldens = np.bincount(zonedata, weights=vols * densities, minlength=num_zones)
+        if not self.is_box:
+            zone_volpos = np.empty((num_zones, 3))
+            for ax in range(3):
+                zone_volpos[:, ax] = np.bincount(zonedata, weights=vols * positions[:, ax], minlength=num_zones)
+
+        list_array = self.read_list_file(list_file)
         if self.is_box:
             info_output = np.zeros((num_struct, 9))
         else:
@@ -1368,103 +1478,86 @@ class ZobovVoids:
         eff_rad = np.zeros(num_struct)
         wtd_avg_dens = np.zeros(num_struct)
 
-        with open(hierarchy_file, 'r') as FHierarchy:
-            FHierarchy.readline()  # skip the first line, contains total number of structures
+        # parse the member zones of every structure from the hierarchy file in one pass
+        hierarchy_members = self.read_hierarchy_members(hierarchy_file, num_struct)
+        if use_stripping or self.is_box:
+            # these paths need the individual member particles: stripping filters on cell
+            # density, and the periodic shift below depends on each particle's position
+            core_pos = positions[np.asarray(list_array[:, 1], dtype=int)]
             for i in range(num_struct):
-                # get the member zones of the structure
-                structline = (FHierarchy.readline()).split()
-                pos = 1
-                add_zones = int(structline[pos]) > 0
-                member_zones = np.asarray(structline[0], dtype=int)
-                while add_zones:
-                    num_zones_to_add = int(structline[pos])
-                    zonestoadd = np.asarray(structline[pos + 2:pos + num_zones_to_add + 2], dtype=int)
-                    member_zones = np.append(member_zones, zonestoadd)
-                    pos += num_zones_to_add + 2
-                    add_zones = int(structline[pos]) > 0
-
-                # get the member particles for these zones
+                member_ids = np.concatenate([zone_order[zone_starts[z]:zone_starts[z + 1]]
+                                             for z in hierarchy_members[i]])
                 if use_stripping:
-                    member_ids = np.logical_and(densities[:] < strip_density_threshold, np.in1d(zonedata, member_zones))
-                else:  # stripDens functionality disabled
-                    member_ids = np.in1d(zonedata, member_zones)
-                member_x = positions[member_ids, 0] - positions[int(list_array[i, 1]), 0]
-                member_y = positions[member_ids, 1] - positions[int(list_array[i, 1]), 1]
-                member_z = positions[member_ids, 2] - positions[int(list_array[i, 1]), 2]
+                    member_ids = member_ids[densities[member_ids] < strip_density_threshold]
                 member_vols = vols[member_ids]
-                member_dens = densities[member_ids]
+                # sum the weights only once and reuse for all the weighted means below
+                total_vol = np.sum(member_vols)
+                wtd_avg_dens[i] = np.dot(densities[member_ids], member_vols) / total_vol
 
+                # volume-weighted barycentre of the structure
+                member_pos = positions[member_ids] - core_pos[i]
                 if self.is_box:
-                    # must account for periodic boundary conditions, assume box coordinates in range [0,box_length]!
-                    shift_vec = np.zeros((len(member_x), 3))
-                    shift_x_ids = abs(member_x) > self.box_length / 2.0
-                    shift_y_ids = abs(member_y) > self.box_length / 2.0
-                    shift_z_ids = abs(member_z) > self.box_length / 2.0
-                    shift_vec[shift_x_ids, 0] = -np.copysign(self.box_length, member_x[shift_x_ids])
-                    shift_vec[shift_y_ids, 1] = -np.copysign(self.box_length, member_y[shift_y_ids])
-                    shift_vec[shift_z_ids, 2] = -np.copysign(self.box_length, member_z[shift_z_ids])
-                    member_x += shift_vec[:, 0]
-                    member_y += shift_vec[:, 1]
-                    member_z += shift_vec[:, 2]
+                    # must account for periodic boundary conditions, assume box coordinates
+                    # in range [0,box_length]!
+                    shift_inds = np.abs(member_pos) > self.box_length / 2.0
+                    member_pos[shift_inds] -= np.copysign(self.box_length, member_pos[shift_inds])
+                centres[i, :] = np.dot(member_vols, member_pos) / total_vol + core_pos[i]
 
-                # volume-weighted barycentre of the structure
-                centres[i, 0] = np.average(member_x, weights=member_vols) + positions[int(list_array[i, 1]), 0]
-                centres[i, 1] = np.average(member_y, weights=member_vols) + positions[int(list_array[i, 1]), 1]
-                centres[i, 2] = np.average(member_z, weights=member_vols) + positions[int(list_array[i, 1]), 2]
+                eff_rad[i] = (3.0 * total_vol * meanvol_trc / (4 * np.pi)) ** (1.0 / 3)
+        else:
+            # no per-particle work is left on this path, so flatten the member zone lists
+            # CSR-style and reduce every structure at once
+            seg_ends = np.cumsum(np.asarray([len(m) for m in hierarchy_members], dtype=int))
+            seg_starts = np.insert(seg_ends[:-1], 0, 0)
+            flat_zones = np.concatenate(hierarchy_members)
+            total_vols = np.add.reduceat(zone_vol[flat_zones], seg_starts)
+            wtd_avg_dens = np.add.reduceat(zone_voldens[flat_zones], seg_starts) / total_vols
+            centres = np.add.reduceat(zone_volpos[flat_zones], seg_starts, axis=0) / total_vols[:, np.newaxis]
+            eff_rad = (3.0 * total_vols * meanvol_trc / (4 * np.pi)) ** (1.0 / 3)
 
-                # put centre coords back within the fiducial box if they have leaked out
-                if self.is_box:
-                    if centres[i, 0] < 0 or centres[i, 0] > self.box_length:
-                        centres[i, 0] -= self.box_length * np.sign(centres[i, 0])
-                    if centres[i, 1] < 0 or centres[i, 1] > self.box_length:
-                        centres[i, 1] -= self.box_length * np.sign(centres[i, 1])
-                    if centres[i, 2] < 0 or centres[i,2] > self.box_length:
-                        centres[i, 2] -= self.box_length * np.sign(centres[i, 2])
+        if self.is_box:
+            # put centre coords back within the fiducial box if they have leaked out
+            outside = np.logical_or(centres < 0, centres > self.box_length)
+            centres[outside] -= self.box_length * np.sign(centres[outside])
 
-                # total volume of structure in Mpc/h, and effective radius
-                void_vol = np.sum(member_vols) * meanvol_trc
-                eff_rad[i] = (3.0 * void_vol / (4 * np.pi)) ** (1.0 / 3)
+        info_output[:, 0] = list_array[:, 0]
+        info_output[:, 4] = eff_rad
+        info_output[:, 5] = list_array[:, 2] - 1.
+        info_output[:, 6] = wtd_avg_dens - 1.
+        info_output[:, 7] = (wtd_avg_dens - 1.) * eff_rad ** 1.2
+        info_output[:, 8] = list_array[:, 7]
+        if self.is_box:
+            info_output[:, 1:4] = centres[:, :3]
+        else:
+            centre_obs = self.zobovbox2obs(centres) # centres - self.box_length / 2.0
+            rdist = np.linalg.norm(centre_obs, axis=1)
+            eff_angrad = np.degrees(eff_rad / rdist)
+            centre_redshifts = self.cosmo.get_redshift(rdist)
+            centre_dec = 90 - np.degrees((np.arccos(centre_obs[:, 2] / rdist)))
+            centre_ra = np.degrees(np.arctan2(centre_obs[:, 1], centre_obs[:, 0]))
+            centre_ra[centre_ra < 0] += 360
+            mask = self.mask
+            nside = hp.get_nside(mask)
+            pixel = hp.ang2pix(nside, np.deg2rad(90 - centre_dec), np.deg2rad(centre_ra))
+            off_mask = mask[pixel] == 0
+            centre_redshifts[off_mask] = -1
+            centre_dec[off_mask] = -60
+            centre_ra[off_mask] = -60
+            eff_angrad[off_mask] = 0
+            edge_flag[off_mask] = 2
+            out_of_redshift = np.logical_or(centre_redshifts < self.z_min, centre_redshifts > self.z_max)
+            centre_redshifts[out_of_redshift] = -1
+            centre_dec[out_of_redshift] = -60
+            centre_ra[out_of_redshift] = -60
+            eff_angrad[out_of_redshift] = 0
+            edge_flag[out_of_redshift] = 2
 
-                # average density of member cells weighted by cell volumes
-                wtd_avg_dens[i] = np.average(member_dens, weights=member_vols)
-
-            info_output[:, 0] = list_array[:, 0]
-            info_output[:, 4] = eff_rad
-            info_output[:, 5] = list_array[:, 2] - 1.
-            info_output[:, 6] = wtd_avg_dens - 1.
-            info_output[:, 7] = (wtd_avg_dens - 1.) * eff_rad ** 1.2
-            info_output[:, 8] = list_array[:, 7]
-            if self.is_box:
-                info_output[:, 1:4] = centres[:, :3]
-            else:
-                centre_obs = self.zobovbox2obs(centres) # centres - self.box_length / 2.0
-                rdist = np.linalg.norm(centre_obs, axis=1)
-                eff_angrad = np.degrees(eff_rad / rdist)
-                centre_redshifts = self.cosmo.get_redshift(rdist)
-                centre_dec = 90 - np.degrees((np.arccos(centre_obs[:, 2] / rdist)))
-                centre_ra = np.degrees(np.arctan2(centre_obs[:, 1], centre_obs[:, 0]))
-                centre_ra[centre_ra < 0] += 360
-                mask = hp.read_map(self.mask_file, verbose=False)
-                nside = hp.get_nside(mask)
-                pixel = hp.ang2pix(nside, np.deg2rad(90 - centre_dec), np.deg2rad(centre_ra))
-                centre_redshifts[mask[pixel] == 0] = -1
-                centre_dec[mask[pixel] == 0] = -60
-                centre_ra[mask[pixel] == 0] = -60
-                eff_angrad[mask[pixel] == 0] = 0
-                edge_flag[mask[pixel] == 0] = 2
-                out_of_redshift = np.logical_or(centre_redshifts < self.z_min, centre_redshifts > self.z_max)
-                centre_redshifts[out_of_redshift] = -1
-                centre_dec[out_of_redshift] = -60
-                centre_ra[out_of_redshift] = -60
-                eff_angrad[out_of_redshift] = 0
-                edge_flag[out_of_redshift] = 2
-
-                info_output[:, 1] = centre_ra
-                info_output[:, 2] = centre_dec
-                info_output[:, 3] = centre_redshifts
-                info_output[:, 9] = eff_angrad
-                info_output[:, 10] = edge_flag
-                info_output = info_output[edge_flag < 2]  # remove all the tessellation failures
+            info_output[:, 1] = centre_ra
+            info_output[:, 2] = centre_dec
+            info_output[:, 3] = centre_redshifts
+            info_output[:, 9] = eff_angrad
+            info_output[:, 10] = edge_flag
+            info_output = info_output[edge_flag < 2]  # remove all the tessellation failures
 
         # save output data to file
         header = "%d voids from %s\n" % (len(info_output), self.handle)
@@ -1520,17 +1613,12 @@ class ZobovVoids:
         new_list_file = self.output_folder + self.cluster_prefix + "_list.txt"
 
         # load the list of supercluster candidates
-        clustersread = np.loadtxt(list_file, skiprows=2)
+        clustersread = self.read_list_file(list_file)
         # sort in desc order of max dens
         sorted_order = np.argsort(1. / clustersread[:, 3])
         clustersread = clustersread[sorted_order]
 
         num_clusters = len(clustersread[:, 0])
-        vid = np.asarray(clustersread[:, 0], dtype=int)
-        edgelist = np.asarray(clustersread[:, 1], dtype=int)
-        vollist = clustersread[:, 4]
-        numpartlist = np.asarray(clustersread[:, 5], dtype=int)
-        rlist = clustersread[:, 9]
 
         # load up the cluster hierarchy
         with open(clust_file, 'r') as Fclust:
@@ -1540,25 +1628,21 @@ class ZobovVoids:
             sys.exit('Unequal void numbers in clustfile and listfile, %d and %d!' % (nclusters, num_clusters))
         hierarchy = hierarchy[1:]
 
-        # load up the particle-zone info
-        zonedata = np.loadtxt(zone_file, dtype='int', skiprows=1)
+        # load up the particle-zone info, bucketed by zone for fast member lookups
+        zonedata = self.read_zone_file(zone_file)
+        zone_order, zone_starts = self.zone_buckets(zonedata)
 
         # load the VTFE volume information
-        with open(vol_file, 'r') as File:
-            npart = np.fromfile(File, dtype=np.int32, count=1)[0]
-            if not npart == self.num_tracers:  # sanity check
-                sys.exit('npart = %d in %s.trvol file does not match num_tracers = %d!'
-                         % (npart, self.handle, self.num_tracers))
-            vols = np.fromfile(File, dtype=np.float64, count=npart)
+        vols = self.read_volumes_file(vol_file)
 
         # load the VTFE density information
-        with open(dens_file, 'r') as File:
-            npart = np.fromfile(File, dtype=np.int32, count=1)[0]
-            if not npart == self.num_tracers:  # sanity check
-                sys.exit("npart = %d in %s.cvol file does not match num_tracers = %d!"
-                         % (npart, self.handle, self.num_tracers))
-            densities = np.fromfile(File, dtype=np.float64, count=npart)
-            densities = 1. / densities
+        densities = self.read_volumes_file(dens_file, reciprocal=True)
+
+        # per-zone sums computed once over the full arrays; per-structure totals are then
+        # just small gathers over the member zones (not valid if stripping is in use)
+        num_zones = len(zone_starts) - 1
+        zone_vol = np.bincount(zonedata, weights=vols, minlength=num_zones)
+        zone_voldens = np.bincount(zonedata, weights=vols * densities, minlength=num_zones)
 
         # check whether tracer information is present, re-read in if required
         if not len(self.tracers) == self.num_part_total:
@@ -1569,109 +1653,28 @@ class ZobovVoids:
         # mean volume per tracer particle
         meanvol_trc = (self.box_length ** 3.) / self.num_part_total
 
+        # parse the list of clusters, separating distinct superclusters and performing minimal pruning
+        newclust_lines, newlist_rows, newclust_members, edge_flag, wtd_avg_dens, num_acc = self.prune_structures(
+            clustersread, hierarchy, sorted_order, zone_order, zone_starts, vols, densities, voids=False,
+            dont_merge=dont_merge, use_r_threshold=use_r_threshold, r_threshold=r_threshold,
+            use_link_density_threshold=use_link_density_threshold, link_density_threshold=link_density_threshold,
+            count_all=count_all_clusters, use_stripping=use_stripping, strip_density_threshold=strip_density_threshold)
+
+        # write the new .void file, first line contains the number of clusters
         with open(new_clust_file, 'w') as Fnewclust:
-            with open(new_list_file, 'w') as Fnewlist:
-
-                # initialize variables
-                counted_zones = np.empty(0, dtype=int)
-                edge_flag = np.empty(0, dtype=int)
-                wtd_avg_dens = np.empty(0, dtype=int)
-                num_acc = 0
-
-                for i in range(num_clusters):
-                    coredens = clustersread[i, 3]
-                    clustline = hierarchy[sorted_order[i]].split()
-                    pos = 1
-                    num_zones_to_add = int(clustline[pos])
-                    finalpos = pos + num_zones_to_add + 1
-                    rval = float(clustline[pos + 1])
-                    rstopadd = rlist[i]
-                    num_adds = 0
-                    if rval >= 1 and coredens > self.max_dens_cut and numpartlist[i] >= self.cluster_min_num \
-                            and (count_all_clusters or vid[i] not in counted_zones):
-                        # this zone qualifies as a seed zone
-                        add_more = True
-                        num_acc += 1
-                        zonelist = [vid[i]]
-                        total_vol = vollist[i]
-                        total_num_parts = numpartlist[i]
-                        zonestoadd = []
-                        while num_zones_to_add > 0 and add_more:
-                            zonestoadd = np.asarray(clustline[pos + 2:pos + num_zones_to_add + 2], dtype=int)
-                            dens = coredens / rval
-                            rsublist = rlist[np.in1d(vid, zonestoadd)]
-                            volsublist = vollist[np.in1d(vid, zonestoadd)]
-                            partsublist = numpartlist[np.in1d(vid, zonestoadd)]
-                            if dont_merge or (use_link_density_threshold and dens < link_density_threshold) or \
-                                    (use_r_threshold and max(rsublist) > r_threshold):
-                                # cannot add these zones
-                                rstopadd = rval
-                                add_more = False
-                                finalpos -= (num_zones_to_add + 1)
-                            else:
-                                # keep adding zones
-                                zonelist = np.append(zonelist, zonestoadd)
-                                num_adds += num_zones_to_add
-                                total_vol += np.sum(volsublist)
-                                total_num_parts += np.sum(partsublist)
-                            pos += num_zones_to_add + 2
-                            num_zones_to_add = int(clustline[pos])
-                            rval = float(clustline[pos + 1])
-                            if add_more:
-                                finalpos = pos + num_zones_to_add + 1
-
-                        counted_zones = np.append(counted_zones, zonelist)
-                        member_ids = np.logical_and(
-                            np.logical_or(use_stripping, densities[:] > strip_density_threshold),
-                            np.in1d(zonedata, zonelist))
-                        if use_stripping:  # need to recalculate total_vol and total_num_parts after stripping
-                            total_vol = np.sum(vols[member_ids])
-                            total_num_parts = len(vols[member_ids])
-
-                        if 1 in edgelist[np.in1d(vid, zonestoadd)]:
-                            edge_flag = np.append(edge_flag, 1)
-                        else:
-                            edge_flag = np.append(edge_flag, 0)
-
-                        # average density of member cells weighted by cell volumes
-                        w_a_d = np.sum(vols[member_ids] * densities[member_ids]) / np.sum(vols[member_ids])
-                        wtd_avg_dens = np.append(wtd_avg_dens, w_a_d)
-
-                        newclustline = clustline[:finalpos]
-                        if not add_more:
-                            newclustline.append(str(0))
-                        newclustline.append(str(rstopadd))
-
-                        # write line to the output .void file
-                        for j in range(len(newclustline)):
-                            Fnewclust.write(newclustline[j] + '\t')
-                        Fnewclust.write('\n')
-
-                        if rstopadd > 10 ** 20:
-                            rstopadd = -1  # will be true for structures entirely surrounded by edge particles
-                        # write line to the output _list.txt file
-                        Fnewlist.write('%d\t%d\t%f\t%d\t%d\t%d\t%f\t%f\n' % (vid[i], int(clustersread[i, 2]), coredens,
-                                                                             int(clustersread[i, 5]), num_adds + 1,
-                                                                             total_num_parts, total_vol * meanvol_trc,
-                                                                             rstopadd))
-
-        # tidy up the files
-        # insert first line with number of clusters to the new .void file
-        with open(new_clust_file, 'r+') as Fnewclust:
-            old = Fnewclust.read()
-            Fnewclust.seek(0)
-            topline = "%d\n" % num_acc
-            Fnewclust.write(topline + old)
-
-        # insert header to the output _list.txt file
-        listdata = np.loadtxt(new_list_file)
+            Fnewclust.write("%d\n" % num_acc)
+            Fnewclust.writelines(newclust_lines)
+
+        # write the _list.txt file directly from the accumulated rows
+        listdata = np.asarray(newlist_rows)
         header = "%d non-edge tracers in %s, %d clusters\n" % (self.num_non_edge, self.handle, num_acc)
         header = header + "ClusterID CoreParticle CoreDens Zone#Parts Cluster#Zones Cluster#Parts" + \
                  "ClusterVol(Mpc/h^3) ClusterDensRatio"
         np.savetxt(new_list_file, listdata, fmt='%d %d %0.6f %d %d %d %0.6f %0.6f', header=header)
 
-        # now find the maximum density centre locations of the superclusters
-        list_array = np.loadtxt(new_list_file)
+        # now find the maximum density centre locations of the superclusters, reusing the
+        # accepted rows and member zone lists still held in memory
+        list_array = listdata
         if self.is_box:
             info_output = np.zeros((num_acc, 9))
         else:
@@ -1680,62 +1683,53 @@ class ZobovVoids:
         wtd_avg_dens = np.zeros(num_acc)
         centres = np.empty((num_acc, 3))
 
-        with open(new_clust_file, 'r') as FHierarchy:
-            FHierarchy.readline()  # skip the first line, contains total number of structures
-            for i in range(num_acc):
-                # get the member zones of the structure
-                structline = (FHierarchy.readline()).split()
-                pos = 1
-                add_zones = int(structline[pos]) > 0
-                member_zones = np.asarray(structline[0], dtype=int)
-                while add_zones:
-                    num_zones_to_add = int(structline[pos])
-                    zonestoadd = np.asarray(structline[pos + 2:pos + num_zones_to_add + 2], dtype=int)
-                    member_zones = np.append(member_zones, zonestoadd)
-                    pos += num_zones_to_add + 2
-                    add_zones = int(structline[pos]) > 0
+        hierarchy_members = newclust_members
 
-                # get the member particles for these zones
-                if use_stripping:
-                    member_ids = np.logical_and(densities[:] > strip_density_threshold, np.in1d(zonedata, member_zones))
-                else:  # stripDens functionality disabled
-                    member_ids = np.in1d(zonedata, member_zones)
-                member_vol = vols[member_ids]
-                member_dens = densities[member_ids]
-
-                # centre location is position of max. density member particle
-                core_part_id = int(list_array[i, 1])
-                centres[i, :] = positions[core_part_id]
+        # centre location is position of max. density member particle
+        centres = positions[np.asarray(list_array[:, 1], dtype=int)]
 
-                # total volume of structure in Mpc/h, and effective radius
-                cluster_vol = np.sum(member_vol) * meanvol_trc
-                eff_rad[i] = (3.0 * cluster_vol / (4 * np.pi)) ** (1.0 / 3)
+        if use_stripping:
+            # stripping filters on cell density, so gather the individual members
+            for i in range(num_acc):
+                member_ids = np.concatenate([zone_order[zone_starts[z]:zone_starts[z + 1]]
+                                             for z in hierarchy_members[i]])
+                member_ids = member_ids[densities[member_ids] > strip_density_threshold]
+                member_vol = vols[member_ids]
+                total_vol = np.sum(member_vol)
+                wtd_avg_dens[i] = np.sum(densities[member_ids] * member_vol) / total_vol
+                eff_rad[i] = (3.0 * total_vol * meanvol_trc / (4 * np.pi)) ** (1.0 / 3)
+        else:
+            # no per-particle work on this path, so flatten the member zone lists CSR-style
+            # and reduce every structure at once from the per-zone sums
+            seg_ends = np.cumsum(np.asarray([len(m) for m in hierarchy_members], dtype=int))
+            seg_starts = np.insert(seg_ends[:-1], 0, 0)
+            flat_zones = np.concatenate(hierarchy_members)
+            total_vols = np.add.reduceat(zone_vol[flat_zones], seg_starts)
+            wtd_avg_dens = np.add.reduceat(zone_voldens[flat_zones], seg_starts) / total_vols
+            eff_rad = (3.0 * total_vols * meanvol_trc / (4 * np.pi)) ** (1.0 / 3)
+
+        info_output[:, 0] = list_array[:, 0]
+        info_output[:, 4] = eff_rad
+        info_output[:, 5] = list_array[:, 2] - 1.
+        info_output[:, 6] = wtd_avg_dens - 1.
+        info_output[:, 7] = (wtd_avg_dens - 1.) * eff_rad ** 1.6
+        info_output[:, 8] = list_array[:, 7]
+        if self.is_box:
+            info_output[:, 1:4] = centres[:, :3]
+        else:
+            centre_obs = self.zobovbox2obs(centres)  # centres - self.box_length / 2.0
+            rdist = np.linalg.norm(centre_obs, axis=1)
+            eff_angrad = np.degrees(eff_rad / rdist)
+            centre_redshifts = self.cosmo.get_redshift(rdist)
+            centre_dec = 90 - np.degrees((np.arccos(centre_obs[:, 2] / rdist)))
+            centre_ra = np.degrees(np.arctan2(centre_obs[:, 1], centre_obs[:, 0]))
+            centre_ra[centre_ra < 0] += 360
 
-                # average density of member cells weighted by cell volumes
-                wtd_avg_dens[i] = np.sum(member_dens * member_vol) / np.sum(member_vol)
-
-            info_output[:, 0] = list_array[:, 0]
-            info_output[:, 4] = eff_rad
-            info_output[:, 5] = list_array[:, 2] - 1.
-            info_output[:, 6] = wtd_avg_dens - 1.
-            info_output[:, 7] = (wtd_avg_dens - 1.) * eff_rad ** 1.6
-            info_output[:, 8] = list_array[:, 7]
-            if self.is_box:
-                info_output[:, 1:4] = centres[:, :3]
-            else:
-                centre_obs = self.zobovbox2obs(centres)  # centres - self.box_length / 2.0
-                rdist = np.linalg.norm(centre_obs, axis=1)
-                eff_angrad = np.degrees(eff_rad / rdist)
-                centre_redshifts = self.cosmo.get_redshift(rdist)
-                centre_dec = 90 - np.degrees((np.arccos(centre_obs[:, 2] / rdist)))
-                centre_ra = np.degrees(np.arctan2(centre_obs[:, 1], centre_obs[:, 0]))
-                centre_ra[centre_ra < 0] += 360
-
-                info_output[:, 1] = centre_ra
-                info_output[:, 2] = centre_dec
-                info_output[:, 3] = centre_redshifts
-                info_output[:, 9] = eff_angrad
-                info_output[:, 10] = edge_flag
+            info_output[:, 1] = centre_ra
+            info_output[:, 2] = centre_dec
+            info_output[:, 3] = centre_redshifts
+            info_output[:, 9] = eff_angrad
+            info_output[:, 10] = edge_flag
 
         # save output data to file
         header = "%d superclusters from %s\n" % (num_acc, self.handle)